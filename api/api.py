@@ -1,4 +1,4 @@
-import io, os, math
+import io, os, math, json
 from datetime import datetime
 from fastapi import FastAPI
 from fastapi.responses import StreamingResponse
@@ -73,30 +73,48 @@ async def get_locations() -> list[dict]:
 # ================================================
 
 
-def process_hires(locid: str, sdate: datetime, edate: datetime) -> pl.DataFrame:
-
-    # return filtered list of files from directory
-    dir_list, path = utils.filter_directory(locid, sdate, edate)
-    print(dir_list)
-
-    if not dir_list:
-        return pl.DataFrame()
-
-    # Read, clean, and concat csv files
-    df_data: pl.DataFrame = utils.clean_csvs(dir_list, path)
+def describe_events(df_data: pl.DataFrame) -> pl.DataFrame:
+    """Add event_descriptor column from event codes"""
 
     # Use series to map values from df to another df, great feature!!
-    df_data = df_data.with_columns(
+    return df_data.with_columns(
         event_descriptor=pl.col("event_code").replace_strict(
             old=ec["event_code"], new=ec["event_descriptor"], default="unknown?"
         )
     )
 
+
+def process_events(
+    locid: str,
+    df_data: pl.DataFrame,
+    sdate: datetime,
+    edate: datetime,
+    df_open: dict | None = None,
+) -> pl.DataFrame:
+    """Pair, label and combine raw hires rows into events
+    that started between sdate & edate
+
+    Args:
+        locid (str): location id
+        df_data (pl.DataFrame): cleaned hires rows sorted by dt
+        sdate (datetime): start of window
+        edate (datetime): end of window
+        df_open (dict | None, optional): open start rows carried from earlier
+            hours, see utils.open_events. Only used for pairing. Defaults to None.
+
+    Returns:
+        pl.DataFrame: events sorted by dt, dt columns left as datetime
+    """
+
+    df_data = describe_events(df_data)
+    if df_open:
+        df_open = {k: describe_events(v) for k, v in df_open.items()}
+
     # ================================================
     # *             Pair Event Code
     #  alarms that have paired event codes for on/off
     # ================================================
-    eventdf_holder = utils.pair_events(ec_pairs, df_data)
+    eventdf_holder = utils.pair_events(ec_pairs, df_data, df_open)
 
     # ================================================
     #  *             Single Event Code
@@ -114,27 +132,91 @@ def process_hires(locid: str, sdate: datetime, edate: datetime) -> pl.DataFrame:
     df_singles_wparms = utils.singles_wparams(ec_single_wparams, df_data)
     eventdf_holder.append(df_singles_wparms)
 
-    df_fin: pl.DataFrame = (
-        (
-            pl.concat(eventdf_holder)
-            .sort(by="dt")
-            .select(pl.lit(locid).alias("loc_id"), pl.all())
-        )
+    df_events: pl.DataFrame = (
+        pl.concat(eventdf_holder)
+        .sort(by="dt")
+        .select(pl.lit(locid).alias("loc_id"), pl.all())
         # Filter out events that did not start between sdate & edate
         .filter(pl.col("dt").is_between(sdate, edate))
-        # Format dates to string and round off duration
-        .with_columns(
-            pl.col("dt").dt.strftime(r"%Y-%m-%d %H:%M:%S%.3f"),
-            pl.col("dt2").dt.strftime(r"%Y-%m-%d %H:%M:%S%.3f"),
-            pl.col("duration").round(1),
-        )
     )
 
+    return df_events
+
+
+def format_grid(df_events: pl.DataFrame) -> pl.DataFrame:
+    """Format dates to string and round off duration for display"""
+
+    return df_events.with_columns(
+        pl.col("dt").dt.strftime(r"%Y-%m-%d %H:%M:%S%.3f"),
+        pl.col("dt2").dt.strftime(r"%Y-%m-%d %H:%M:%S%.3f"),
+        pl.col("duration").round(1),
+    )
+
+
+def process_hires(locid: str, sdate: datetime, edate: datetime) -> pl.DataFrame:
+
+    # return filtered list of files from directory
+    dir_list, path = utils.filter_directory(locid, sdate, edate)
+    print(dir_list)
+
+    if not dir_list:
+        return pl.DataFrame()
+
+    # Read, clean, and concat csv files
+    df_data: pl.DataFrame = utils.clean_csvs(dir_list, path, sdate, edate)
+
+    df_fin = format_grid(process_events(locid, df_data, sdate, edate))
+
     # df_fin.write_csv("api/test_results.csv")
 
     return df_fin
 
 
+def process_hires_hourly(locid: str, sdate: datetime, edate: datetime):
+    """Process hires data one hour file at a time, in chronological order.
+
+    Start rows of events that have not ended by the end of an hour are
+    carried into the next hour, so long events (flash, preempt, etc.) are
+    paired the same as process_hires. Only one hour file plus the open
+    start rows are held in memory.
+
+    Args:
+        locid (str): location id
+        sdate (datetime): start of window
+        edate (datetime): end of window
+
+    Yields:
+        tuple[datetime, pl.DataFrame]: hour start, events that ended (or for
+            single events, happened) in that hour
+    """
+
+    dir_list, path = utils.filter_directory(locid, sdate, edate)
+    print(dir_list)
+
+    df_open = None
+
+    for file in dir_list:
+        df_curr = utils.read_csv(file, path, sdate, edate).sort(by="dt")
+
+        df_events = process_events(locid, df_curr, sdate, edate, df_open)
+
+        # Open rows are kept per event pair, ex. code 1 may be open for
+        # Phase Split while Phase Green already ended
+        df_open = utils.open_events(ec_pairs, df_curr, df_open)
+
+        yield utils.file_dt(file), df_events
+
+
+def ndjson_batches(batches) -> StreamingResponse:
+    """Stream one json object per line (NDJSON) as batches are produced"""
+
+    def lines():
+        for batch in batches:
+            yield json.dumps(batch) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @app.get("/purdue")
 async def get_purdue(
     locid: str, date: str, time: str | None = None, addhrs: int | None = None
@@ -154,14 +236,11 @@ async def get_purdue(
 # ================================================
 
 
-@app.get("/timeline_viz")
-async def get_purdue(
-    locid: str, date: str, time: str | None = None, addhrs: int | None = None
-) -> dict:
-
-    df_hres = process_hires(locid=locid, date=date, time=time, addhrs=addhrs)
+def timeline_series(df_events: pl.DataFrame) -> dict:
+    """Build apexcharts rangeBar series & colors from events
+    with dt columns as datetime"""
 
-    df_viz = df_hres.with_columns(
+    df_viz = df_events.with_columns(
         pl.col("dt").dt.timestamp("ms"), pl.col("dt2").dt.timestamp("ms")
     )
 
@@ -219,6 +298,37 @@ async def get_purdue(
     return res
 
 
+@app.get("/timeline_viz")
+async def get_purdue(
+    locid: str, date: str, time: str | None = None, addhrs: int | None = None
+) -> dict:
+
+    df_hres = process_hires(locid=locid, date=date, time=time, addhrs=addhrs)
+
+    return timeline_series(df_hres)
+
+
+@app.get("/timeline_stream")
+async def get_timeline_stream(locid: str, startdt: str, enddt: str):
+    """Stream timeline series one hour at a time as NDJSON.
+    Every line has the same series names & order so client can append data"""
+
+    enddt = datetime.fromisoformat(enddt)
+    startdt = datetime.fromisoformat(startdt)
+
+    numberOfHrs = (enddt - startdt).total_seconds() // (3600)
+
+    if numberOfHrs > 24:
+        print("Too much data")
+        return ndjson_batches([])
+
+    batches = (
+        {"hour": hr.isoformat(), **timeline_series(df_events)}
+        for hr, df_events in process_hires_hourly(locid, startdt, enddt)
+    )
+    return ndjson_batches(batches)
+
+
 # ================================================
 # *            Hi-res AG grid endpoint
 # Populate hi-res data in ag grid
@@ -248,3 +358,27 @@ async def get_hires_grid(
     # print(df_hres.columns)
 
     return df_hres.to_dicts()
+
+
+@app.get("/hiresgrid_stream")
+async def get_hires_grid_stream(locid: str, startdt: str, enddt: str):
+    """Stream grid data one hour at a time as NDJSON, in chronological order.
+    Each line is a columnar batch: {"hour": ..., "columns": {col: [values]}}"""
+
+    enddt = datetime.fromisoformat(enddt)
+    startdt = datetime.fromisoformat(startdt)
+
+    numberOfHrs = (enddt - startdt).total_seconds() // (3600)
+
+    if numberOfHrs > 24:
+        print("Too much data")
+        return ndjson_batches([])
+
+    batches = (
+        {
+            "hour": hr.isoformat(),
+            "columns": format_grid(df_events).to_dict(as_series=False),
+        }
+        for hr, df_events in process_hires_hourly(locid, startdt, enddt)
+    )
+    return ndjson_batches(batches)
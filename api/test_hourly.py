@@ -0,0 +1,76 @@
+import os
+from datetime import datetime
+from pathlib import Path
+import polars as pl
+import pytest
+
+REPO = Path(__file__).resolve().parent.parent
+
+# Phase 2 cycles, each in clearance when the hour turns:
+# green (1,7) ends before the hour, split (1,11) ends after it
+CYCLES = [
+    ("09:58:00", "09:59:00", "09:59:04", "10:00:01"),
+    ("10:00:15", "10:00:55", "10:00:59", "10:01:02"),
+    ("10:58:00", "10:59:00", "10:59:04", "11:00:01"),
+    ("11:00:15", "11:00:55", "11:00:59", "11:01:02"),
+]
+
+
+def write_files(directory: Path):
+    """Write synthetic TRAF hour files for 09:00-11:00 at location 1"""
+
+    rows = {"09": [], "10": [], "11": []}
+    for green, yellow, red, end in CYCLES:
+        for time, code in [
+            (green, 1),
+            (yellow, 7),
+            (yellow, 8),
+            (red, 9),
+            (red, 10),
+            (end, 11),
+        ]:
+            rows[time[:2]].append(f"9/20/2024 {time}.000, {code}, 2\r\n")
+
+    directory.mkdir()
+    for hr, lines in rows.items():
+        header = [f"header {i}\r\n" for i in range(6)]
+        file = directory / f"TRAF_00001_2024_09_20_{hr}00.csv"
+        with open(file, "w", newline="") as f:
+            f.write("".join(header + lines))
+
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    write_files(tmp_path / "Ctrl00001")
+    monkeypatch.setenv("DIRECTORY", str(tmp_path) + "/")
+    # event code csvs are read relative to repo root
+    monkeypatch.chdir(REPO)
+
+    import api
+
+    # share lists files in name order
+    listdir = os.listdir
+    monkeypatch.setattr(api.utils.os, "listdir", lambda p: sorted(listdir(p)))
+    return api
+
+
+def test_hourly_matches_process_hires(api):
+    sdate = datetime(2024, 9, 20, 9, 0)
+    edate = datetime(2024, 9, 20, 11, 30)
+
+    df_full = api.process_hires("1", sdate, edate)
+    df_stream = pl.concat(
+        api.format_grid(df) for _, df in api.process_hires_hourly("1", sdate, edate)
+    )
+
+    cols = ["dt", "event_code", "event_code2", "parameter"]
+    assert df_stream.sort(cols).equals(df_full.sort(cols))
+
+    # green carried over the hour is not paired with next hour's green end
+    greens = df_stream.filter(pl.col("event_code2") == 7).sort("dt")["dt"].to_list()
+    assert greens == [
+        "2024-09-20 09:58:00.000",
+        "2024-09-20 10:00:15.000",
+        "2024-09-20 10:58:00.000",
+        "2024-09-20 11:00:15.000",
+    ]
@@ -1,7 +1,27 @@
-import os
-from datetime import datetime
+import io, os, json
+from datetime import datetime, timedelta
 import polars as pl
 
+# Number of header rows at top of each hires file
+HEADER_ROWS = 6
+
+# Extra minutes read before a sub-hour window so pair_events
+# still sees the start codes of events open at start of window
+INDEX_LOOKBACK = timedelta(minutes=int(os.getenv("INDEX_LOOKBACK_MINUTES", "5")))
+
+# Extra minutes read after a sub-hour window so events starting in the window
+# still see their end codes. Unset reads to end of hour file, events ending
+# later than the lookahead (long preempt, flash, etc.) are dropped if set
+INDEX_LOOKAHEAD = (
+    timedelta(minutes=int(os.getenv("INDEX_LOOKAHEAD_MINUTES")))
+    if os.getenv("INDEX_LOOKAHEAD_MINUTES")
+    else None
+)
+
+# Indexes used by this process, {(path, file): index}
+# Keeps index when INDEX_DIRECTORY is read only
+INDEX_CACHE: dict[tuple[str, str], dict] = {}
+
 
 def format_dt(dt: datetime) -> str:
     """Return date and hr in filename format form
@@ -25,6 +45,33 @@ def format_dt(dt: datetime) -> str:
     return date, hr
 
 
+def file_name(locid: str, dt: datetime) -> str:
+    """Return hires filename for the hour containing dt
+
+    Args:
+        locid (str): location id, already zero padded to 5 chars
+        dt (datetime): datetime
+
+    Returns:
+        str: hires filename, ex. TRAF_00001_2024_09_20_0900.csv
+    """
+    date, hr = format_dt(dt)
+    return f"TRAF_{locid}_{date}_{hr}.csv"
+
+
+def file_dt(file: str) -> datetime:
+    """Return starting hour of hires file from filename
+
+    Args:
+        file (str): hires filename, ex. TRAF_00001_2024_09_20_0900.csv
+
+    Returns:
+        datetime: start of hour recorded in file
+    """
+    parts = file.removesuffix(".csv").split("_")
+    return datetime.strptime("_".join(parts[2:]), r"%Y_%m_%d_%H%M")
+
+
 def filter_directory(locid: str, sdt: datetime, edt: datetime):
 
     try:
@@ -36,13 +83,10 @@ def filter_directory(locid: str, sdt: datetime, edt: datetime):
         dir_list = os.listdir(path)
 
         # format datetime to filename date & hr format
-        sdate, stime = format_dt(sdt)
-        edate, etime = format_dt(edt)
-
-        start_file_name = f"TRAF_{locid}_{sdate}_{stime}.csv"
+        start_file_name = file_name(locid, sdt)
         idx = dir_list.index(start_file_name)
 
-        end_file_name = f"TRAF_{locid}_{edate}_{etime}.csv"
+        end_file_name = file_name(locid, edt)
         idx_end = dir_list.index(end_file_name)
 
         # **Add hr if minute in end datetime
@@ -59,49 +103,293 @@ def filter_directory(locid: str, sdt: datetime, edt: datetime):
     return dir_list, path
 
 
-def clean_csvs(dir_list: list, path: str):
+def format_columns(df: pl.DataFrame) -> pl.DataFrame:
+    """Parse raw string columns of hires file to datetime & integers"""
 
-    # ===========================
-    #      Read Csv Data
-    #   Clean/Format data
-    #   Create one df from selected files
-    # ===========================
+    return df.with_columns(
+        pl.col("dt").str.to_datetime(r"%-m/%d/%Y %H:%M:%S%.3f"),
+        pl.col("event_code").str.replace_all(" ", ""),
+        pl.col("parameter").str.replace_all(" ", ""),
+        # location_id=pl.lit(locid),
+    ).with_columns(
+        pl.col("event_code").str.to_integer(),
+        pl.col("parameter").str.to_integer(),
+    )
+
+
+def index_path(file: str, path: str) -> str:
+    """Return location of sparse index for hires file.
+    Saved under INDEX_DIRECTORY (default DIRECTORY/index/) in same Ctrl folder,
+    NOT in the hires folder itself so filter_directory listing is unchanged"""
+
+    index_dir = os.getenv("INDEX_DIRECTORY", os.getenv("DIRECTORY") + "index/")
+    return index_dir + os.path.basename(path) + "/" + file.replace(".csv", ".json")
+
+
+def row_minute(line: bytes) -> int | None:
+    """Return minute of hires row, None if line is not a complete row
+
+    Args:
+        line (bytes): ex. b"9/20/2024 09:05:00.100, 82, 1"
+
+    Returns:
+        int | None: minute of row
+    """
+    fields = line.split(b",")
+    if len(fields) != 3 or not fields[1].strip().isdigit():
+        return None
+    if not fields[2].strip().isdigit():
+        return None
+
+    time = fields[0].split(b" ")[-1].split(b":")
+    if len(time) != 3 or not time[1].isdigit():
+        return None
+    return int(time[1])
+
+
+def build_index(file: str, path: str) -> dict:
+    """Scan hires file once and record byte offset of first row of each minute
+
+    Args:
+        file (str): hires filename
+        path (str): directory containing file
+
+    Returns:
+        dict: {"size", "mtime", "offsets"}, offsets[m] is byte offset of first
+            row at or after minute m, offsets[60] is end of last complete row
+    """
+    source = path + "/" + file
+    stat = os.stat(source)
+    offsets = []
+
+    with open(source, "rb") as f:
+        for _ in range(HEADER_ROWS):
+            f.readline()
+        pos = f.tell()
+
+        for line in f:
+            if not line.strip():
+                pos += len(line)
+                continue
+
+            minute = row_minute(line)
+
+            if minute is None:
+                # Last line may be partially written, do not read it
+                if not line.endswith(b"\n"):
+                    break
+                print(f"{file}: skipped malformed row at byte {pos}")
+            else:
+                while len(offsets) <= minute:
+                    offsets.append(pos)
+            pos += len(line)
+
+    while len(offsets) <= 60:
+        offsets.append(pos)
+
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "offsets": offsets}
+
+
+def is_writing(file: str, path: str) -> bool:
+    """Return True if hires file was modified in the current hour,
+    ie. file for current hour is still being written"""
+
+    mtime = datetime.fromtimestamp(os.stat(path + "/" + file).st_mtime)
+    return mtime >= datetime.now().replace(minute=0, second=0, microsecond=0)
+
+
+def load_index(file: str, path: str) -> dict:
+    """Return index for hires file from memory or disk, (re)build if missing
+    or stale. Files are overwritten after 30 days and current hour is still
+    being written, so index is checked against file size & mtime"""
+
+    stat = os.stat(path + "/" + file)
+
+    def is_current(index: dict) -> bool:
+        return index["size"] == stat.st_size and index["mtime"] == stat.st_mtime
+
+    index = INDEX_CACHE.get((path, file))
+    if index is not None and is_current(index):
+        return index
+
+    idx_file = index_path(file, path)
+
+    try:
+        with open(idx_file) as f:
+            index = json.load(f)
+        if not is_current(index):
+            index = None
+    except (OSError, ValueError, KeyError):
+        index = None
+
+    if index is None:
+        index = build_index(file, path)
+
+        try:
+            os.makedirs(os.path.dirname(idx_file), exist_ok=True)
+            with open(idx_file, "w") as f:
+                json.dump(index, f)
+        # Typ read only share, index only kept in INDEX_CACHE
+        except OSError as err:
+            print(err)
+
+    INDEX_CACHE[(path, file)] = index
+    return index
+
+
+def read_csv(
+    file: str, path: str, sdt: datetime | None = None, edt: datetime | None = None
+) -> pl.DataFrame:
+    """Read and clean a single hires hour file
+
+    If sdt & edt are passed and only part of the hour is needed, the sparse
+    minute index is used to skip rows before sdt (less INDEX_LOOKBACK) and,
+    if INDEX_LOOKAHEAD_MINUTES is set, rows after edt (plus INDEX_LOOKAHEAD).
+    File still being written this hour is always read whole, its index
+    would be rebuilt on every request.
+
+    Args:
+        file (str): hires filename
+        path (str): directory containing file
+        sdt (datetime | None, optional): start of window. Defaults to None.
+        edt (datetime | None, optional): end of window. Defaults to None.
+
+    Returns:
+        pl.DataFrame: dt, event_code, parameter columns
+    """
+    print(file)
 
-    df_holder = []
+    hr_start = file_dt(file)
+    hr_end = hr_start + timedelta(hours=1)
 
-    for file in dir_list:
-        print(file)
+    lo = hr_start if sdt is None else max(sdt - INDEX_LOOKBACK, hr_start)
+    hi = hr_end
+    if edt is not None and INDEX_LOOKAHEAD is not None:
+        hi = min(edt + INDEX_LOOKAHEAD, hr_end)
+
+    # Whole file needed, no need for index
+    if (lo == hr_start and hi == hr_end) or is_writing(file, path):
         df = pl.read_csv(
             # source=path + "\\" + file,
             source=path + "/" + file,
             has_header=False,
-            skip_rows=6,
+            skip_rows=HEADER_ROWS,
             new_columns=["dt", "event_code", "parameter"],
         )
+        return format_columns(df)
+
+    offsets = load_index(file, path)["offsets"]
 
-        # format columns
-        df = df.with_columns(
-            pl.col("dt").str.to_datetime(r"%-m/%d/%Y %H:%M:%S%.3f"),
-            pl.col("event_code").str.replace_all(" ", ""),
-            pl.col("parameter").str.replace_all(" ", ""),
-            # location_id=pl.lit(locid),
-        ).with_columns(
-            pl.col("event_code").str.to_integer(),
-            pl.col("parameter").str.to_integer(),
+    # Window does not overlap file
+    if hi <= lo:
+        start = end = 0
+    else:
+        start = offsets[lo.minute]
+        end = offsets[hi.minute + 1] if hi < hr_end else offsets[60]
+
+    if end <= start:
+        df = pl.DataFrame(
+            schema={"dt": pl.String, "event_code": pl.String, "parameter": pl.String}
         )
+        return format_columns(df)
+
+    with open(path + "/" + file, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+
+    df = pl.read_csv(
+        io.BytesIO(data),
+        has_header=False,
+        infer_schema=False,
+        new_columns=["dt", "event_code", "parameter"],
+    )
+    return format_columns(df)
+
+
+def clean_csvs(
+    dir_list: list, path: str, sdt: datetime | None = None, edt: datetime | None = None
+):
 
-        df_holder.append(df)
+    # ===========================
+    #      Read Csv Data
+    #   Clean/Format data
+    #   Create one df from selected files
+    # ===========================
+
+    df_holder = [read_csv(file, path, sdt, edt) for file in dir_list]
 
     return pl.concat(df_holder).sort(by="dt")
 
 
-def pair_events(ec_pairs: list[tuple], df_data: pl.DataFrame) -> list[pl.DataFrame]:
+def pair_params(
+    ec_pair: tuple, df_data: pl.DataFrame, df_open: dict | None = None
+) -> list:
+    """Return unique parameters with a start code for event pair,
+    including parameters of start rows carried from earlier hours"""
+
+    # Return series of all unigue parameters codes for current event_start code
+    ec_params = (
+        df_data.filter(pl.col("event_code") == ec_pair[0])["parameter"]
+        .unique()
+        .to_list()
+    )
+    if df_open:
+        for k in df_open:
+            if k[:2] == (ec_pair[0], ec_pair[1]) and k[2] not in ec_params:
+                ec_params.append(k[2])
+
+    return ec_params
+
+
+def on_off_events(
+    ec_pair: tuple,
+    param: int,
+    df_data: pl.DataFrame,
+    df_open: dict | None = None,
+) -> pl.DataFrame:
+    """Return start/end rows of event pair for one parameter,
+    keeping only rows that follow the on/off pattern
+
+    Args:
+        ec_pair (tuple): (event_start_code, event_end_code, event_descriptor)
+        param (int): parameter, ex. phase
+        df_data (pl.DataFrame): dataset read from purdue csv file
+        df_open (dict | None, optional): open start rows carried from earlier
+            hours, {(event_start_code, event_end_code, param): row}. Defaults to None.
+
+    Returns:
+        pl.DataFrame: alternating start, end, start, ... rows
+    """
+
+    df_ec = df_data.filter(
+        pl.col("event_code").is_in([ec_pair[0], ec_pair[1]]),
+        pl.col("parameter") == param,
+    )
+    # df_ec.write_csv("df_ec1.csv")
+
+    # Carried start row is only used by the pair it is open for,
+    # ex. code 1 can be open for Phase Split but closed for Phase Green
+    if df_open and (ec_pair[0], ec_pair[1], param) in df_open:
+        df_ec = pl.concat([df_open[(ec_pair[0], ec_pair[1], param)], df_ec])
+
+    # Shift event codes to compare
+    # filter and keep event_codes that DO NOT MATCH (on/off pattern)
+    return df_ec.filter(
+        pl.col("event_code") != pl.col("event_code").shift(1, fill_value=ec_pair[1])
+    )
+
+
+def pair_events(
+    ec_pairs: list[tuple], df_data: pl.DataFrame, df_open: dict | None = None
+) -> list[pl.DataFrame]:
     """Process events that have different event codes that mark start and finish of event.
     ex. Phase Green (ec=1, ec=7). The parameter determines phase for example case
 
     Args:
         ec_pairs (list[tuple]): [(event_start_code, event_end_code, event_descriptor), ...]
         df_data (pl.DataFrame): _description_
+        df_open (dict | None, optional): open start rows carried from earlier
+            hours, see open_events. Defaults to None.
 
     Returns:
         list[pl.DataFrame]: _description_
@@ -111,26 +399,10 @@ def pair_events(ec_pairs: list[tuple], df_data: pl.DataFrame) -> list[pl.DataFra
 
     for ec_pair in ec_pairs:
 
-        # Return series of all unigue parameters codes for current event_start code
-        ec_params = df_data.filter(pl.col("event_code") == ec_pair[0])[
-            "parameter"
-        ].unique()
-
-        for param in ec_params:
+        for param in pair_params(ec_pair, df_data, df_open):
             # print(f"ec1: {ec_pair[0]}, ec2: {ec_pair[1]}: param: {param} ")
 
-            df_ec = df_data.filter(
-                pl.col("event_code").is_in([ec_pair[0], ec_pair[1]]),
-                pl.col("parameter") == param,
-            )
-            # df_ec.write_csv("df_ec1.csv")
-
-            # Shift event codes to compare
-            # filter and keep event_codes that DO NOT MATCH (on/off pattern)
-            df_ec = df_ec.filter(
-                pl.col("event_code")
-                != pl.col("event_code").shift(1, fill_value=ec_pair[1])
-            )
+            df_ec = on_off_events(ec_pair, param, df_data, df_open)
 
             # df_ec.write_csv("df_ec2.csv")
             # print(df_ec)
@@ -167,6 +439,36 @@ def pair_events(ec_pairs: list[tuple], df_data: pl.DataFrame) -> list[pl.DataFra
     return eventdf_holder
 
 
+def open_events(
+    ec_pairs: list[tuple], df_data: pl.DataFrame, df_open: dict | None = None
+) -> dict:
+    """Return start rows of paired events that have not ended yet.
+    These are the trailing start rows pair_events deletes, used to carry
+    events into the next hour when processing one hour at a time.
+
+    Args:
+        ec_pairs (list[tuple]): [(event_start_code, event_end_code, event_descriptor), ...]
+        df_data (pl.DataFrame): dataset read from purdue csv file
+        df_open (dict | None, optional): open start rows carried into df_data.
+            Defaults to None.
+
+    Returns:
+        dict: {(event_start_code, event_end_code, param): open start row}
+    """
+
+    open_rows = {}
+
+    for ec_pair in ec_pairs:
+
+        for param in pair_params(ec_pair, df_data, df_open):
+            df_ec = on_off_events(ec_pair, param, df_data, df_open)
+
+            if df_ec["event_code"].item(df_ec.height - 1) == ec_pair[0]:
+                open_rows[(ec_pair[0], ec_pair[1], param)] = df_ec.tail(1)
+
+    return open_rows
+
+
 def single_events(ec_singles: list, df_data: pl.DataFrame) -> pl.DataFrame:
     """Process event codes that do not have end. These are just points in time and are notifications.
     ex. Coord Pattern Change
@@ -1,4 +1,5 @@
 import { API_URL } from "./env.js";
+import { readNdjson } from "./ndjson.js";
 
 const locationSel = document.getElementById("locations");
 const start_dtInput = document.getElementById("start_dt");
@@ -79,29 +80,57 @@ async function fetchLocids() {
  *               Fetch grid data function
  *=============================================**/
 
-async function fetch_griddata() {
-  // TODO: ***add exception catch, return for ag grid
+/**
+ * Converts columnar batch {col: [values]} to list of row objects for ag grid
+ *
+ * @param {object} columns - column name to list of values
+ * @returns {object[]} list of row objects
+ */
+function columnsToRows(columns) {
+  const names = Object.keys(columns);
+  if (names.length === 0) return [];
+
+  return columns[names[0]].map((_, i) => {
+    let row = {};
+    for (const name of names) {
+      row[name] = columns[name][i];
+    }
+    return row;
+  });
+}
 
+async function fetch_griddata() {
   // default datetime has 'T' format; remove and split date/hour
   let sdt = start_dtInput.value.replace("T", " ");
   let edt = end_dtInput.value.replace("T", " ");
 
-  let response = await fetch(
-    `${API_URL}/hiresgrid?locid=${locationSel.value}&startdt=${sdt}&enddt=${edt}`
-  );
+  // CLEAR GRID, HOURS ARE APPENDED AS THEY ARRIVE
+  gridApi.setGridOption("rowData", []);
+  noDataNotification.classList.add("is-hidden");
 
-  // list of dictionaries
-  let gridDataObj = await response.json();
+  // one columnar batch per hour file, in chronological order
+  let numRows = 0;
+  try {
+    let response = await fetch(
+      `${API_URL}/hiresgrid_stream?locid=${locationSel.value}&startdt=${sdt}&enddt=${edt}`
+    );
 
-  // CHECK IF DATA WAS RETURNED; IF NOT SHOW NOTIFICATION BANNER
-  if (Object.keys(gridDataObj).length === 0) {
+    await readNdjson(response, (batch) => {
+      let rows = columnsToRows(batch.columns);
+      numRows += rows.length;
+      gridApi.applyTransaction({ add: rows });
+    });
+  } catch (error) {
+    // request failed or stream died partway, data may be incomplete
+    console.error(error.message);
     noDataNotification.classList.remove("is-hidden");
-  } else {
-    noDataNotification.classList.add("is-hidden");
+    return;
   }
 
-  // FILL AG GRID WITH DATA
-  gridApi.setGridOption("rowData", gridDataObj);
+  // CHECK IF DATA WAS RETURNED; IF NOT SHOW NOTIFICATION BANNER
+  if (numRows === 0) {
+    noDataNotification.classList.remove("is-hidden");
+  }
 }
 
 /**============================================
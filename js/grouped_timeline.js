@@ -1,3 +1,6 @@
+import { API_URL } from "./env.js";
+import { readNdjson } from "./ndjson.js";
+
 var options = {
   series: [],
   chart: {
@@ -59,14 +62,41 @@ chart.render();
 
 // populate chart test
 // var url = "http://my-json-server.typicode.com/apexcharts/apexcharts.js/yearly";
+// IF QUERY PARAMETERS PASSED, USE location and datetimes, else test defaults
+var searchParams = new URLSearchParams(window.location.search);
+var locid = searchParams.get("locid") ?? "1";
+var startdt = searchParams.get("startdt") ?? "2024-09-20 09:00";
+var enddt = searchParams.get("enddt") ?? "2024-09-20 10:00";
+
 var url =
-  "http://127.0.0.1:8000/timeline_viz?locid=1&date=2024-09-20&time=0900&addhrs=1";
+  `${API_URL}/timeline_stream?locid=${encodeURIComponent(locid)}` +
+  `&startdt=${encodeURIComponent(startdt)}&enddt=${encodeURIComponent(enddt)}`;
+
+// Append each hour batch to chart as it arrives
+// NOTE: every batch has same series names & order
+var chartSeries = [];
+
+function appendBatch(batch) {
+  if (chartSeries.length === 0) {
+    chartSeries = batch.series.map((s) => ({ name: s.name, data: [] }));
+    chart.updateOptions({ colors: batch.colors });
+  }
+
+  batch.series.forEach((s, i) => {
+    chartSeries[i].data.push(...s.data);
+  });
+  chart.updateSeries(chartSeries);
+}
+
+async function fetchTimeline() {
+  try {
+    let response = await fetch(url);
+    await readNdjson(response, appendBatch);
+  } catch (error) {
+    // request failed or stream died partway, data may be incomplete
+    console.error(error.message);
+    chart.updateOptions({ noData: { text: "Error loading data...." } });
+  }
+}
 
-axios({
-  method: "GET",
-  url: url,
-}).then(function (response) {
-  console.log(response);
-  // chart.updateSeries(response.data);
-  chart.updateOptions(response.data);
-});
+fetchTimeline();
@@ -0,0 +1,34 @@
+/**
+ * Reads NDJSON response body, calls onBatch with each parsed line
+ * as soon as it arrives.
+ * Throws if response status is not ok or stream ends with a broken line,
+ * a stream that dies partway also rejects from reader.read()
+ *
+ * @param {Response} response - fetch response with NDJSON body
+ * @param {function} onBatch - called with each parsed json object
+ */
+export async function readNdjson(response, onBatch) {
+  if (!response.ok) {
+    throw new Error(`Response status: ${response.status}`);
+  }
+
+  const reader = response.body
+    .pipeThrough(new TextDecoderStream())
+    .getReader();
+  let buffer = "";
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+
+    buffer += value;
+    let lines = buffer.split("\n");
+    // last item is partial line, keep for next chunk
+    buffer = lines.pop();
+
+    for (const line of lines) {
+      if (line.trim()) onBatch(JSON.parse(line));
+    }
+  }
+  if (buffer.trim()) onBatch(JSON.parse(buffer));
+}